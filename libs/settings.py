@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+
+from jnius import autoclass
+
+System = autoclass('android.provider.Settings$System')
+PythonActivity = autoclass('org.renpy.android.PythonActivity')
+
+
+class Settings(object):
+
+    @staticmethod
+    def get_display_brightness():
+        return System.getInt(PythonActivity.mActivity.getContentResolver(),
+                             System.SCREEN_BRIGHTNESS)
+
+    @staticmethod
+    def get_display_brightness_mode():
+        return System.getInt(PythonActivity.mActivity.getContentResolver(),
+                             System.SCREEN_BRIGHTNESS_MODE)
+
+    @staticmethod
+    def get_display_timeout():
+        return System.getInt(PythonActivity.mActivity.getContentResolver(),
+                             System.SCREEN_OFF_TIMEOUT)
@@ -37,7 +37,7 @@ class CPU(DeviceMonitor):
             self.logger.warn("Failed to read CPU frequency")
             return result
 
-        times = SystemInfo.get_usr_sys_total_times(self.num)
+        times = SystemInfo.get_usr_sys_total_times(self.num, iter_num)
 
         if len(times) == 0:
             self.logger.warn("Failed to read CPU times")
@@ -64,6 +64,10 @@ class CPU(DeviceMonitor):
         pids = SystemInfo.get_running_pids()
 
         if pids is not None:
+            SystemInfo.cleanup_dead_pids(pids)
+
+            active_pids = []
+
             for i, pid in enumerate(pids):
                 if pid < 0:
                     break
@@ -75,7 +79,7 @@ class CPU(DeviceMonitor):
                     uid = SystemInfo.get_uid_for_pid(pid)
 
                     if uid >= 0:
-                        self._pid_states[pid] = CPUState(uid)
+                        pid_state = self._pid_states[pid] = CPUState(uid)
                     else:
                         # Assume process no longer exists
                         continue
@@ -85,42 +89,52 @@ class CPU(DeviceMonitor):
                     # just assume that it's not using any of the CPU for this
                     # iteration
                     pid_state.skip_update(iter_num, total_time)
+                    self._absorb_pid_state(pid_state)
                 else:
-                    times = SystemInfo.get_pid_usr_sys_times(pid)
+                    active_pids.append(pid)
 
-                    if len(times) > 0:
-                        usr_time = times[SystemInfo.INDEX_USR_TIME]
-                        sys_time = times[SystemInfo.INDEX_SYS_TIME]
+            # Read the times of all remaining processes in one batch
+            pid_times = SystemInfo.get_pid_usr_sys_times_batch(active_pids)
 
-                        # Update slice of time used by this process based on
-                        # global iteration time
-                        pid_state.update(usr_time, sys_time, total_time,
-                                         iter_num)
+            for pid in active_pids:
+                pid_state = self._pid_states[pid]
+                times = pid_times.get(pid)
 
-                        if not init:
-                            continue
+                if times is not None:
+                    usr_time = times[SystemInfo.INDEX_USR_TIME]
+                    sys_time = times[SystemInfo.INDEX_SYS_TIME]
 
-                uid_state = self._uid_states.get(pid_state.uid, None)
+                    # Update slice of time used by this process based on
+                    # global iteration time
+                    pid_state.update(usr_time, sys_time, total_time, iter_num)
 
-                # Register new UID if it doesn't exist. Else absorb power data
-                # from its respective process
-                if uid_state is not None:
-                    self._uid_states[pid_state.uid] = pid_state
-                else:
-                    uid_state.absorb(pid_state)
+                    if not init:
+                        continue
+
+                self._absorb_pid_state(pid_state)
 
         # Remove processes that are no longer active
         self._pid_states = {k: v for k, v in self._pid_states.iteritems() if
                             self._pid_states[k].is_alive(iter_num)}
 
         # Collect the summed UID information
-        for k, v in self._uid_states.iteritems():
+        for uid, uid_state in self._uid_states.iteritems():
             uid_usage = self._get_cpu_usage(uid_state.get_usr_perc(),
                                             uid_state.get_sys_perc(), freq)
             result.set_uid_usage(uid, uid_usage)
 
         return result
 
+    def _absorb_pid_state(self, pid_state):
+        """ Register new UID if it doesn't exist. Else absorb power data from
+        its respective process """
+        uid_state = self._uid_states.get(pid_state.uid, None)
+
+        if uid_state is None:
+            self._uid_states[pid_state.uid] = pid_state
+        else:
+            uid_state.absorb(pid_state)
+
     def _get_cpu_usage(self, usr_perc, sys_perc, freq):
         """ Predicts the CPU P-state as if it was running a single process. Finds
         the lowest frequency that keeps the CPU usage under 70% assuming there
@@ -160,7 +174,7 @@ class CPU(DeviceMonitor):
                 freq_khz = fp.read().strip()
             if freq_khz.isdigit():
                 return int(freq_khz) // 1000
-        except (IOError, ValueError), (errno, strerror):
+        except (IOError, ValueError):
             pass
 
         try:
@@ -170,9 +184,9 @@ class CPU(DeviceMonitor):
                 freq_line = 3 * (self.num + 1)
                 if data[freq_line - 1].startswith("BogoMIPS"):
                     return int(data.split(":")[1].strip())
-        except (IOError, IndexError, ValueError), (errno, strerror):
+        except (IOError, IndexError, ValueError) as e:
             self.logger.error("Failed to read CPU{0} frequency: {1}".format(
-                self.num, strerror))
+                self.num, e))
 
         return 0
 
@@ -195,7 +209,9 @@ class CPUUsage(UsageData):
 
 
 class CPUState(object):
-    __slots__ = ['_iteration', '_inactive_iters']
+    __slots__ = ['uid', '_last_usr', '_last_sys', '_last_total', '_delta_usr',
+                 '_delta_sys', '_delta_total', '_last_update', '_iteration',
+                 '_inactive_iters']
 
     def __init__(self, uid):
         self.uid = uid
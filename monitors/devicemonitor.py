@@ -10,8 +10,6 @@ class DeviceMonitor(threading.Thread):
     __slots__ = ["_constants", "has_uid_information"]
 
     def __init__(self, monitor_name, devconstants):
-        self.daemon = True
-
         self.has_uid_information = False
         self.monitor_name = monitor_name
         self._constants = devconstants
@@ -19,6 +17,8 @@ class DeviceMonitor(threading.Thread):
         self._stop = threading.Event()
 
         super(DeviceMonitor, self).__init__(target=self._run)
+        # Thread refuses to set daemon before its __init__ has run
+        self.daemon = True
         self._data_lock = threading.Lock()
         #self.start()
 
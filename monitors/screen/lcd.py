@@ -18,7 +18,7 @@ class LCD(Screen):
 
         brightness = Screen.get_display_brightness()
 
-        if 0 <= brightness <= 255:
+        if not 0 <= brightness <= 255:
             self.logger.warn("Could not retrieve brightness information")
             return result
 
@@ -8,6 +8,8 @@ from services.usagedata import UsageData
 from utils.foregrounddetector import ForegroundDetector
 from utils.hardware import Hardware
 
+import mmap
+import operator
 import os
 import random
 import struct
@@ -16,12 +18,20 @@ import struct
 class OLED(Screen):
 
     NSAMPLES = 500
+    SAMPLES_SEED = 0xA11CE
+
+    # { (width, height, NSAMPLES) : (offsets, start, struct) }
+    _fb_sample_cache = {}
 
     def __init__(self, devconstants):
         super(OLED, self).__init__(Hardware.OLED, devconstants)
 
         self._fb_file = None
-        self._fb_samples = []
+        self._fb_fd = None
+        self._fb_mmap = None
+        self._fb_samples = ()
+        self._fb_struct = None
+        self._fb_start = 0
         self._setup_fb()
         self._setup_fb_samples()
 
@@ -32,22 +42,92 @@ class OLED(Screen):
         # 585225 = 65025 * 3^2 (three colors)
         self.MODULATION_PWR = devconstants.OLED_MODULATION_PWR / 585225
 
+        # Per-channel power lookup tables indexed by 8-bit channel value, plus
+        # the modulation correction indexed by the sum of the three channels
+        self._red_lut = [self.RED_PWR * c * c for c in range(256)]
+        self._green_lut = [self.GREEN_PWR * c * c for c in range(256)]
+        self._blue_lut = [self.BLUE_PWR * c * c for c in range(256)]
+        self._sum_lut = [-self.MODULATION_PWR * c * c for c in range(766)]
+
     def _setup_fb(self):
         """ Choose framebuffer file
         """
         # TODO: Change permission to read file
-        if os.path.isfile("/dev/fb0"):
+        # Framebuffers are character devices, so isfile() never matches them
+        if os.path.exists("/dev/fb0"):
             self._fb_file = "/dev/fb0"
-        elif os.path.isfile("/dev/graphics/fb0"):
+        elif os.path.exists("/dev/graphics/fb0"):
             self._fb_file = "/dev/graphics/fb0"
 
+        if self._fb_file is None:
+            return
+
+        # Map the framebuffer once so sampling pixels doesn't need any
+        # syscalls. Fall back to reading the file if mapping is not allowed
+        try:
+            self._fb_fd = os.open(self._fb_file, os.O_RDONLY)
+            self._fb_mmap = mmap.mmap(self._fb_fd,
+                                      self.width * self.height * 4,
+                                      mmap.MAP_SHARED, mmap.PROT_READ)
+        except (EnvironmentError, ValueError) as e:
+            self.logger.warn("Can't map framebuffer {0}".format(e))
+            self._close_fb()
+
+    def _close_fb(self):
+        """ Release framebuffer mapping and its file descriptor. """
+        if self._fb_mmap is not None:
+            self._fb_mmap.close()
+            self._fb_mmap = None
+        if self._fb_fd is not None:
+            os.close(self._fb_fd)
+            self._fb_fd = None
+
+    def _on_exit(self):
+        super(OLED, self)._on_exit()
+        self._close_fb()
+
     def _setup_fb_samples(self):
         """ Choose samples from framebuffer for averaging pixel color
-        impact on power usage. """
-
-        factor = self.width * self.height // self.NSAMPLES
-        for i in xrange(self.NSAMPLES):
-            self._fb_samples.append((factor * i) + random.randint(0, factor))
+        impact on power usage. Samples only depend on screen size, so they
+        are shared by every OLED monitor of the same size. """
+
+        key = (self.width, self.height, self.NSAMPLES)
+        samples = OLED._fb_sample_cache.get(key)
+
+        if samples is None:
+            factor = self.width * self.height // self.NSAMPLES
+            if factor == 0:
+                # Screen size is unknown or smaller than the number of
+                # samples, leave the framebuffer unsampled
+                samples = ((), 0, None)
+            else:
+                samples = self._build_fb_samples(factor)
+            OLED._fb_sample_cache[key] = samples
+
+        self._fb_samples, self._fb_start, self._fb_struct = samples
+
+    def _build_fb_samples(self, factor):
+        """ Return (offsets, start, struct) for sampling one pixel out of
+        every factor pixels. """
+        # One sample per equally sized region, so offsets come out strictly
+        # ascending and the framebuffer is walked front to back. Seeded so
+        # every run samples the same pixels
+        rand = random.Random(self.SAMPLES_SEED)
+        offsets = tuple((factor * i) + rand.randrange(factor)
+                        for i in range(self.NSAMPLES))
+
+        # Compile a single struct that gathers the blue, green and red bytes
+        # of every sampled 32-bit pixel in one unpack call, starting at the
+        # first sample. Padding can only move forward, which the ascending
+        # order guarantees
+        start = offsets[0] * 4
+        fmt = ['<']
+        pos = start
+        for x in offsets:
+            fmt.append("{0}xxBBB".format(x * 4 - pos))
+            pos = x * 4 + 4
+
+        return (offsets, start, struct.Struct("".join(fmt)))
 
     def calc_iteration(self, iter_num):
         """ Return power usage of each application using display after one
@@ -56,7 +136,7 @@ class OLED(Screen):
 
         brightness = Screen.get_display_brightness()
 
-        if 0 <= brightness <= 255:
+        if not 0 <= brightness <= 255:
             self.logger.warn("Could not retrieve brightness information")
             return result
 
@@ -66,38 +146,18 @@ class OLED(Screen):
         px_pwr = 0.0
 
         # TODO: Substitute with C-based getScreenPixPower native function
-        if screen and self._fb_file is not None:
-            try:
-                with open(self._fb_file) as fp:
-                    for x in self._fb_samples:
-                        fp.seek(x * 4)
-                        # Read 32-bit integer from file
-                        px = struct.unpack('i', fp.read(4))[0]
-                        blue = px >> 8 & 0xFF
-                        green = px >> 16 & 0xFF
-                        red = px >> 24 & 0xFF
-
-                        # Calculate the power usage of this pixel as if it were
-                        # at full brightness. Linearly scale by brightness to
-                        # get true power usage. To calculate whole screen power
-                        # usage, compute average of sampled region and multiply
-                        # by number of pixels
-
-                        sum_colors = red + green + blue
-                        px_pwr += (self.RED_PWR * (red*red) +
-                                   self.GREEN_PWR * (green*green) +
-                                   self.BLUE_PWR * (blue*blue) -
-                                   self.MODULATION_PWR *
-                                   (sum_colors * sum_colors))
-            except IOError as (errno, strerr):
-                self.logger.warn("Can't read framebuffer {0}".format(strerr))
-                px_pwr = 0.0
+        # Pixel power is scaled by brightness, so skip sampling at zero
+        if (screen and brightness > 0 and self._fb_file is not None and
+                self._fb_struct is not None):
+            px_pwr = self._pixel_power(self._read_fb_samples(),
+                                       self._red_lut, self._green_lut,
+                                       self._blue_lut, self._sum_lut)
 
             if px_pwr > 0.0:
                 px_pwr *= self.width * self.height / self.NSAMPLES
 
         if screen:
-            usage = OLEDUsage(brightness, px_pwr)
+            usage = OLEDUsage(True, brightness, px_pwr)
             uid = ForegroundDetector.get_foreground_uid()
             result.set_uid_usage(uid, usage)
         else:
@@ -107,6 +167,47 @@ class OLED(Screen):
 
         return result
 
+    @staticmethod
+    def _pixel_power(channels, red_lut, green_lut, blue_lut, sum_lut):
+        """ Sum the power usage of pixels given as consecutive blue, green
+        and red values, using the precomputed channel lookup tables.
+
+        Calculate the power usage of each pixel as if it were at full
+        brightness. Linearly scale by brightness to get true power usage. To
+        calculate whole screen power usage, compute average of sampled region
+        and multiply by number of pixels.
+        """
+        blues = channels[0::3]
+        greens = channels[1::3]
+        reds = channels[2::3]
+        sums = map(operator.add, map(operator.add, reds, greens), blues)
+
+        return (sum(map(red_lut.__getitem__, reds)) +
+                sum(map(green_lut.__getitem__, greens)) +
+                sum(map(blue_lut.__getitem__, blues)) +
+                sum(map(sum_lut.__getitem__, sums)))
+
+    def _read_fb_samples(self):
+        """ Return blue, green and red values of every sampled framebuffer
+        pixel, one after the other. """
+        if self._fb_struct is None:
+            return ()
+
+        try:
+            if self._fb_mmap is not None:
+                return self._fb_struct.unpack_from(self._fb_mmap,
+                                                   self._fb_start)
+
+            with open(self._fb_file, 'rb') as fp:
+                # Read the pixels from first to last sample at once
+                fp.seek(self._fb_start)
+                return self._fb_struct.unpack_from(
+                    fp.read(self._fb_struct.size))
+        except (IOError, struct.error) as e:
+            self.logger.warn("Can't read framebuffer {0}".format(e))
+
+        return ()
+
 
 class OLEDUsage(UsageData):
 
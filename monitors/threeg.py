@@ -10,9 +10,9 @@ from services.iterationdata import IterationData
 from services.usagedata import UsageData
 from services.powerestimator import PowerEstimator
 from utils.hardware import Hardware
-from utils.sysfs import Node
 from utils.systeminfo import SystemInfo
 
+import errno
 import os
 import time
 
@@ -27,23 +27,37 @@ class ThreeG(DeviceMonitor):
     TX_PKT_MASK = "/sys/devices/virtual/net/{0}/statistics/tx_packets"
     RX_BYTE_MASK = "/sys/devices/virtual/net/{0}/statistics/rx_bytes"
     TX_BYTE_MASK = "/sys/devices/virtual/net/{0}/statistics/tx_bytes"
-    UID_STATS_FOLDER = "/proc/uid_state/"
-    UID_TX_BYTE_MASK = UID_STATS_FOLDER.join("{0}/tcp_snd")
-    UID_RX_BYTE_MASK = UID_STATS_FOLDER.join("{0}/tcp_rcv")
+    UID_STATS_FOLDER = "/proc/uid_stat/"
+    UID_TX_BYTE_MASK = os.path.join(UID_STATS_FOLDER, "{0}", "tcp_snd")
+    UID_RX_BYTE_MASK = os.path.join(UID_STATS_FOLDER, "{0}", "tcp_rcv")
+    # Each UID keeps two counter files open. Counters of UIDs beyond this many
+    # are opened and closed on each read, leaving descriptors for the rest of
+    # the app
+    MAX_UID_FDS = 128
 
     def __init__(self, devconstants, iface="rmnet0"):
         super(ThreeG, self).__init__(Hardware.THREEG, devconstants)
         self._telephony = TelephonyAccess()
         self.iface = devconstants.THREEG_INTERFACE
         self._provider = self._telephony.get_operator_name()
-        self._state = ThreeGState(
-            devconstants.get_3g_dhcfach_time(self._provider),
+        # Timing and queue parameters shared by interface and UID states
+        self._state_params = (
+            devconstants.get_3g_dchfach_time(self._provider),
             devconstants.get_3g_fachidle_time(self._provider),
             devconstants.get_3g_tx_queue(self._provider),
             devconstants.get_3g_rx_queue(self._provider))
+        self._state = ThreeGState(*self._state_params)
 
         self._uid_states = {}
-        self._sysfs = Node(self.NET_STATISTIC_MASK.format(self.iface))
+        self._uid_fd_count = 0  # UIDs whose counter files are kept open
+        # Interface counters are read every iteration, so resolve their paths
+        # once instead of walking sysfs through a Node on each read
+        self._iface_files = [mask.format(self.iface) for mask in
+                             (self.TX_PKT_MASK, self.RX_PKT_MASK,
+                              self.TX_BYTE_MASK, self.RX_BYTE_MASK)]
+        # Descriptors are kept open across iterations and opened on demand, as
+        # the interface may not exist yet
+        self._iface_fds = [None] * len(self._iface_files)
 
         # Test file existence
         self.has_uid_information = os.access(self.UID_STATS_FOLDER, os.F_OK)
@@ -52,6 +66,8 @@ class ThreeG(DeviceMonitor):
         """ Return power usage of each application using 3G interface during
         one iteration."""
         result = IterationData()
+        # Every state update during this iteration shares the same timestamp
+        now = SystemClock.elapsedRealtime()
 
         net_type = self._telephony.get_network_type()
 
@@ -68,22 +84,19 @@ class ThreeG(DeviceMonitor):
             # We need to allow the real interface state to reset itself so that
             # the next update it knows it's coming back from an off state. We
             # also need to clear all UID information
-            self._state.interface_off()
-            self._uid_states.clear()
+            self._state.interface_off(now)
+            self._clear_uid_states()
 
             result.set_sys_usage(ThreeGUsage())
 
             return result
 
-        tx_pkts = int(self._sysfs.tx_packets)
-        rx_pkts = int(self._sysfs.rx_packets)
-        tx_bytes = int(self._sysfs.tx_bytes)
-        rx_bytes = int(self._sysfs.rx_bytes)
+        tx_pkts, rx_pkts, tx_bytes, rx_bytes = self._read_iface_stats()
 
         if (tx_bytes == -1) or (rx_bytes == -1):
             self.logger.warn("Failed to read  UID Tx/Rx byte counts")
             return result
-        self._state.update(tx_pkts, rx_pkts, tx_bytes, rx_bytes)
+        self._state.update(tx_pkts, rx_pkts, tx_bytes, rx_bytes, now)
 
         if self._state.is_initialized():
             result.set_sys_usage(ThreeGUsage(True, self._state.delta_pkts,
@@ -95,27 +108,31 @@ class ThreeG(DeviceMonitor):
         uids = SystemInfo.get_uids()
 
         if uids is not None:
+            # Forget UIDs that went away so their files are closed
+            self._clear_uid_states(set(uids))
+            uid_usages = {}
+
             for uid in uids:
                 if uid < 0:
                     continue
 
-                uid_state = self._uid_states.setdefault(uid, ThreeGState())
+                uid_state = self._uid_states.get(uid)
+                if uid_state is None:
+                    uid_state = ThreeGState(*self._state_params)
+                    self._uid_states[uid] = uid_state
 
-                if uid_state.is_stale():
+                if uid_state.is_stale(now):
                     # Use heuristic to not poll for UIDs that haven't had much
                     # activity recently
                     continue
 
                 # Read operations are the expensive part of polling
-                with open(self.UID_TX_BYTE_MASK.format(uid)) as fp:
-                    tx_bytes = int(fp.read().strip())
-                with open(self.UID_RX_BYTE_MASK.format(uid)) as fp:
-                    rx_bytes = int(fp.read().strip())
+                tx_bytes, rx_bytes = self._read_uid_bytes(uid, uid_state)
 
                 if (rx_bytes == -1) or (tx_bytes == -1):
                     self.logger.warn("Failed to read UID Tx/Rx byte counts")
                 elif uid_state.is_initialized():
-                    uid_state.update(0, 0, tx_bytes, rx_bytes)
+                    uid_state.update(0, 0, tx_bytes, rx_bytes, now)
 
                     if ((uid_state.tx_bytes + uid_state.rx_bytes != 0) or
                             (uid_state.pwr_state != self.POWER_STATE_IDLE)):
@@ -123,12 +140,115 @@ class ThreeG(DeviceMonitor):
                                             uid_state.tx_bytes,
                                             uid_state.rx_bytes,
                                             uid_state.pwr_state, self._provider)
-                        result.set_uid_usage(uid, usage)
+                        uid_usages[uid] = usage
                 else:
-                    uid_state.update(0, 0, tx_bytes, rx_bytes)
+                    uid_state.update(0, 0, tx_bytes, rx_bytes, now)
+
+            result.bulk_set_uid_usage(uid_usages)
 
         return result
 
+    def _on_exit(self):
+        super(ThreeG, self)._on_exit()
+        for i, fd in enumerate(self._iface_fds):
+            if fd is not None:
+                os.close(fd)
+                self._iface_fds[i] = None
+        self._clear_uid_states()
+
+    def _clear_uid_states(self, keep=()):
+        """ Drop the state of every UID not in keep, closing its counter
+        files.
+        """
+        for uid in [uid for uid in self._uid_states if uid not in keep]:
+            self._close_uid_files(self._uid_states.pop(uid))
+
+    def _close_uid_files(self, uid_state):
+        """ Close the counter files cached in uid_state, if any. """
+        if uid_state.tx_fd is not None:
+            self._uid_fd_count -= 1
+        uid_state.close()
+
+    def _read_iface_stats(self):
+        """ Return interface tx packets, rx packets, tx bytes and rx bytes
+        counters. Counters that can't be read are returned as -1.
+        """
+        stats = []
+        for i, filename in enumerate(self._iface_files):
+            try:
+                if self._iface_fds[i] is None:
+                    self._iface_fds[i] = os.open(filename, os.O_RDONLY)
+                stats.append(self._read_int(self._iface_fds[i]))
+            except (OSError, ValueError):
+                # Interface may have gone away. Reopen on next iteration
+                if self._iface_fds[i] is not None:
+                    os.close(self._iface_fds[i])
+                    self._iface_fds[i] = None
+                stats.append(-1)
+
+        return stats
+
+    def _read_uid_bytes(self, uid, uid_state):
+        """ Return tx and rx byte counters of uid, using the counter files
+        cached in uid_state. Counters that can't be read are returned as -1.
+        """
+        try:
+            if uid_state.tx_fd is None:
+                return self._read_new_uid_bytes(uid, uid_state)
+            return self._read_int(uid_state.tx_fd), self._read_int(
+                uid_state.rx_fd)
+        except (OSError, ValueError):
+            self._close_uid_files(uid_state)
+
+        return -1, -1
+
+    def _read_new_uid_bytes(self, uid, uid_state):
+        """ Open and read the counter files of a uid which has none cached,
+        and keep them open in uid_state if the cache has room.
+        """
+        keep = self._uid_fd_count < self.MAX_UID_FDS
+        fds = []
+        try:
+            for mask in (self.UID_TX_BYTE_MASK, self.UID_RX_BYTE_MASK):
+                path = mask.format(uid)
+                try:
+                    fds.append(os.open(path, os.O_RDONLY))
+                except OSError as e:
+                    if e.errno not in (errno.EMFILE, errno.ENFILE):
+                        raise
+                    # Out of descriptors. Give the cached ones back to the
+                    # rest of the app and read without keeping files open
+                    self.logger.warn("Out of file descriptors, closing "
+                                     "counter files of {0} UIDs".format(
+                                         self._uid_fd_count))
+                    for state in self._uid_states.values():
+                        self._close_uid_files(state)
+                    keep = False
+                    fds.append(os.open(path, os.O_RDONLY))
+            counters = self._read_int(fds[0]), self._read_int(fds[1])
+        except (OSError, ValueError):
+            for fd in fds:
+                os.close(fd)
+            raise
+
+        if keep:
+            uid_state.tx_fd, uid_state.rx_fd = fds
+            self._uid_fd_count += 1
+        else:
+            for fd in fds:
+                os.close(fd)
+        return counters
+
+    @staticmethod
+    def _read_int(fd):
+        """ Read integer value of an open sysfs/procfs file. Rewinding makes
+        the kernel regenerate the file contents.
+
+        Integer -> Integer
+        """
+        os.lseek(fd, 0, os.SEEK_SET)
+        return int(os.read(fd, 32))
+
 
 class ThreeGUsage(UsageData):
     __slots__ = ['pwr_state', 'provider']
@@ -152,8 +272,11 @@ class ThreeGUsage(UsageData):
 
 
 class ThreeGState(object):
-    __slots__ = ['pwr_state', '_dch_fach_time', 'fach_idle_time',
-                 '_txqueue_size', '_rxqueue_size']
+    __slots__ = ['tx_pkts', 'rx_pkts', 'tx_bytes', 'rx_bytes', 'delta_pkts',
+                 'delta_tx_bytes', 'delta_rx_bytes', 'pwr_state',
+                 '_pwr_state_time', '_inactive_time', '_update_time',
+                 '_dch_fach_time', '_fach_idle_time', '_txqueue_size',
+                 '_rxqueue_size', 'tx_fd', 'rx_fd']
 
     def __init__(self, dch_fach_time, fach_idle_time, txqueue_size,
                  rxqueue_size):
@@ -172,16 +295,31 @@ class ThreeGState(object):
         self._fach_idle_time = fach_idle_time
         self._txqueue_size = txqueue_size
         self._rxqueue_size = rxqueue_size
-
-    def interface_off(self):
-        self._update_time = SystemClock.elapsedRealtime()
+        # Counter files of the UID this state tracks, opened on first poll
+        self.tx_fd = None
+        self.rx_fd = None
+
+    def close(self):
+        """ Close counter files opened for this state. """
+        if self.tx_fd is not None:
+            os.close(self.tx_fd)
+            self.tx_fd = None
+        if self.rx_fd is not None:
+            os.close(self.rx_fd)
+            self.rx_fd = None
+
+    def interface_off(self, now=None):
+        if now is None:
+            now = SystemClock.elapsedRealtime()
+        self._update_time = now
         self.pwr_state = ThreeG.POWER_STATE_IDLE
 
     def is_initialized(self):
         return self._update_time is not None
 
-    def update(self, tx_pkts, rx_pkts, tx_bytes, rx_bytes):
-        now = SystemClock.elapsedRealtime()
+    def update(self, tx_pkts, rx_pkts, tx_bytes, rx_bytes, now=None):
+        if now is None:
+            now = SystemClock.elapsedRealtime()
 
         if (self._update_time is not None) and (now > self._update_time):
             delta_time = now - self._update_time
@@ -231,16 +369,22 @@ class ThreeGState(object):
         self.tx_bytes = tx_bytes
         self.rx_bytes = rx_bytes
 
-    def is_stale(self):
+    def is_stale(self, now=None):
         """ Heuristic to avoid excessive polling on UIDs. We shouldn't
         update state on every iteration as it takes too much time
 
-        None -> Boolean
+        Integer -> Boolean
         """
         if self.pwr_state != ThreeG.POWER_STATE_IDLE:
             return True
 
+        # Never updated, so it needs a first poll
+        if self._update_time is None:
+            return False
+
+        if now is None:
+            now = SystemClock.elapsedRealtime()
+
         # TODO: check if 10000 us the correct number (Why 10s?)
         # Reduce this number if we want more frequent 3G checks
-        return ((SystemClock.elapsedRealtime() - self._update_time) >
-                min(10000, self._inactive_time))
+        return (now - self._update_time) > min(10000, self._inactive_time)
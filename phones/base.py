@@ -13,6 +13,8 @@ from monitors.wifi import Wifi
 from phones.device import Device
 from utils.hardware import Hardware
 
+from bisect import bisect_right
+
 
 class Constants(object):
     PROVIDER_ATT = "AT&T"
@@ -40,15 +42,68 @@ class Constants(object):
     WIFI_LINK_SPEEDS = []
 
     @classmethod
-    def _get_sensor_pwr_ratios(cls):
-        powers = {}
+    def get_sensor_pwr_ratios(cls):
+        """ Return { sensor name : power } for every sensor of the device.
+        Sensors are only enumerated on first call.
+        """
+        powers = vars(cls).get('_sensor_pwr_ratios')
 
-        for name, power in SensorsAccess.get_sensors():
-            powers[name] = power * Constants.BATTERY_VOLTAGE
+        if powers is None:
+            powers = {}
+            for name, power in SensorsAccess.get_sensors().items():
+                powers[name] = power * cls.BATTERY_VOLTAGE
+            cls._sensor_pwr_ratios = powers
 
         return powers
 
-    SENSOR_PWR_RATIOS = _get_sensor_pwr_ratios()
+    @classmethod
+    def get_3g_powers(cls, provider):
+        """ Return idle, FACH and DCH power for provider, in ThreeG power
+        state order. Values are looked up once per provider.
+        """
+        cache = vars(cls).get('_3g_powers')
+
+        if cache is None:
+            cache = cls._3g_powers = {}
+
+        powers = cache.get(provider)
+
+        if powers is None:
+            powers = (cls.get_3g_idle_power(provider),
+                      cls.get_3g_fach_power(provider),
+                      cls.get_3g_dch_power(provider))
+            cache[provider] = powers
+
+        return powers
+
+    @classmethod
+    def get_cpu_pwr_ratio_lut(cls):
+        """ Return CPU power ratios for every frequency (MHz) from CPU_FREQS[0]
+        to CPU_FREQS[-1], linearly interpolated between the two closest
+        frequencies. Only frequencies that have a ratio are tabulated, higher
+        ones use the last ratio. The table is built once per device.
+        """
+        lut = vars(cls).get('_cpu_pwr_ratio_lut')
+
+        if lut is None:
+            freqs = cls.CPU_FREQS
+            ratios = cls.CPU_PWR_RATIOS
+            n = min(len(freqs), len(ratios))
+            lut = []
+            if n == 1:
+                # A single ratio applies to every frequency
+                lut.append(ratios[0])
+            elif n > 1:
+                for i in range(1, n):
+                    slope = ((ratios[i] - ratios[i - 1]) /
+                             (freqs[i] - freqs[i - 1]))
+                    for freq in range(freqs[i - 1], freqs[i]):
+                        lut.append(ratios[i - 1] +
+                                   slope * (freq - freqs[i - 1]))
+                lut.append(ratios[n - 1])
+            cls._cpu_pwr_ratio_lut = lut
+
+        return lut
 
     # The following methods are too specific and need to be implemented
     # according to the device in question
@@ -93,28 +148,6 @@ class Constants(object):
             "Constants shouldn't be instantiated directly")
 
 
-class BaseDevice(Device):
-    hardware = {
-        Hardware.CPU: CPU(Constants),
-        Hardware.LCD: LCD(Constants),
-        Hardware.WIFI: Wifi(Constants),
-        Hardware.THREEG: ThreeG(Constants),
-        Hardware.GPS: GPS(Constants),
-        Hardware.AUDIO: Audio(Constants),
-        Hardware.SENSORS: Sensors(Constants),
-    }
-
-    power_function = {
-        Hardware.CPU: BasePowerCalculator.get_cpu_power,
-        Hardware.LCD: BasePowerCalculator.get_lcd_power,
-        Hardware.WIFI: BasePowerCalculator.get_wifi_power,
-        Hardware.THREEG: BasePowerCalculator.get_3g_power,
-        Hardware.GPS: BasePowerCalculator.get_gps_power,
-        Hardware.AUDIO: BasePowerCalculator.get_audio_power,
-        Hardware.SENSORS: BasePowerCalculator.get_sensor_power,
-    }
-
-
 class BasePowerCalculator(object):
     @classmethod
     def get_lcd_power(cls, lcd_data):
@@ -126,32 +159,21 @@ class BasePowerCalculator(object):
 
     @classmethod
     def get_cpu_power(cls, cpu_data):
-        """ Find the two closest CPU frequencies and linearly interpolate the
-        power ratio for current freq
+        """ Look up the power ratio for current freq, linearly interpolated
+        between the two closest CPU frequencies
         """
-        if not cpu_data or len(Constants.CPU_PWR_RATIOS) == 0:
+        if not cpu_data:
+            return 0
+
+        lut = Constants.get_cpu_pwr_ratio_lut()
+        if not lut:
             return 0
-        elif len(Constants.CPU_PWR_RATIOS) == 1:
-            ratio = Constants.CPU_PWR_RATIOS[0]
-        else:
-            freq = cpu_data.freq
-            if cpu_data.freq < Constants.CPU_PWR_RATIOS[0]:
-                freq = Constants.CPU_FREQS[0]
-            if cpu_data.freq > Constants.CPU_PWR_RATIOS[-1]:
-                freq = Constants.CPU_FREQS[-1]
-
-            i = cls._upper_bound(freq, Constants.CPU_FREQS)
-
-            if i == 0:
-                i += 1
-            elif i == len(Constants.CPU_FREQS):
-                i -= 1
-
-            ratio = (Constants.CPU_PWR_RATIOS[i - 1] +
-                     (Constants.CPU_PWR_RATIOS[i] - Constants.CPU_PWR_RATIOS[
-                         i - 1]) /
-                     (Constants.CPU_FREQS[i] - Constants.CPU_FREQS[i - 1]) *
-                     (freq - Constants.CPU_FREQS[i - 1]))
+
+        # The table has one entry per MHz, so fractional frequencies use the
+        # nearest one. Frequencies outside the table use the closest ratio
+        i = min(max(int(round(cpu_data.freq)) - Constants.CPU_FREQS[0], 0),
+                len(lut) - 1)
+        ratio = lut[i]
 
         return max(0, ratio * (cpu_data.usr_perc + cpu_data.sys_perc))
 
@@ -174,27 +196,11 @@ class BasePowerCalculator(object):
         if wifi_data.pwr_state == Wifi.POWER_STATE_LOW:
             return Constants.WIFI_LOW_PWR
         if wifi_data.pwr_state == Wifi.POWER_STATE_HIGH:
-            if len(Constants.WIFI_LINK_SPEEDS) == 1:
-                # If there is only one set speed we have to use its ratio as we
-                # have nothing else to use
-                ratio = Constants.WIFI_LINK_RATIOS[0]
-            else:
-                # Find two nearest speed/ratio pairs and linearly interpolate
-                # the ratio for this link speed
-
-                i = cls._upper_bound(wifi_data.speed, Constants
-                .WIFI_LINK_SPEEDS)
-                if i == 0:
-                    i += 1
-                elif i == len(Constants.WIFI_LINK_SPEEDS):
-                    i -= 1
-
-                ratio = (Constants.WIFI_LINK_RATIOS[i - 1] +
-                         (Constants.WIFI_LINK_RATIOS[i] -
-                          Constants.WIFI_LINK_RATIOS[i - 1]) /
-                         (Constants.WIFI_LINK_SPEEDS[i] - Constants
-                         .WIFI_LINK_SPEEDS[i - 1]) *
-                         (wifi_data.speed - Constants.WIFI_LINK_SPEEDS[i - 1]))
+            # Linearly interpolate the ratio between the two nearest link
+            # speeds. With a single speed its ratio is all we have to use
+            ratio = cls._interpolate(wifi_data.speed,
+                                     Constants.WIFI_LINK_SPEEDS,
+                                     Constants.WIFI_LINK_RATIOS)
 
         return max(0, Constants.WIFI_HIGH_PWR + ratio * wifi_data.tx_rate)
 
@@ -202,12 +208,11 @@ class BasePowerCalculator(object):
     def get_3g_power(cls, threeg_data):
         if not threeg_data or not threeg_data.on:
             return 0
-        if threeg_data.pwr_state == ThreeG.POWER_STATE_IDLE:
-            return Constants.get_3g_idle_power(threeg_data.provider)
-        if threeg_data.pwr_state == ThreeG.POWER_STATE_FACH:
-            return Constants.get_3g_fach_power(threeg_data.provider)
-        if threeg_data.pwr_state == ThreeG.POWER_STATE_DCH:
-            return Constants.get_3g_dch_power(threeg_data.provider)
+        if threeg_data.pwr_state in (ThreeG.POWER_STATE_IDLE,
+                                     ThreeG.POWER_STATE_FACH,
+                                     ThreeG.POWER_STATE_DCH):
+            powers = Constants.get_3g_powers(threeg_data.provider)
+            return powers[threeg_data.pwr_state]
 
         return 0
 
@@ -216,21 +221,47 @@ class BasePowerCalculator(object):
         if not sensor_data:
             return 0
 
-        res = sum(time * power for time, power in
-                  zip(sensor_data.on_times.values(),
-                      Constants.SENSOR_PWR_RATIOS.values()))
+        # Match on sensor name, as two dicts don't keep their values in the
+        # same order
+        powers = Constants.get_sensor_pwr_ratios()
+        return sum(time * powers.get(name, 0) for name, time in
+                   sensor_data.on_times.items())
 
     @classmethod
-    def _upper_bound(cls, value, list_):
-        lo = 0
-        hi = len(list_)
+    def _interpolate(cls, value, xs, ys):
+        """ Return ys linearly interpolated at value, with xs sorted in
+        ascending order. Values outside xs get the first or last of ys.
+        """
+        i = bisect_right(xs, value)
+
+        if i == 0:
+            return ys[0]
+        if i == len(xs):
+            return ys[-1]
 
-        while lo < hi:
-            mid = lo + (hi - lo) // 2
-            if list_[mid] <= value:
-                lo = mid + 1
-            else:
-                hi = mid
+        return ys[i - 1] + ((ys[i] - ys[i - 1]) / (xs[i] - xs[i - 1]) *
+                            (value - xs[i - 1]))
 
-        return lo
 
+class BaseDevice(Device):
+    constants = Constants
+
+    monitors = {
+        Hardware.CPU: CPU,
+        Hardware.LCD: LCD,
+        Hardware.WIFI: Wifi,
+        Hardware.THREEG: ThreeG,
+        Hardware.GPS: GPS,
+        Hardware.AUDIO: Audio,
+        Hardware.SENSORS: Sensors,
+    }
+
+    power_function = {
+        Hardware.CPU: BasePowerCalculator.get_cpu_power,
+        Hardware.LCD: BasePowerCalculator.get_lcd_power,
+        Hardware.WIFI: BasePowerCalculator.get_wifi_power,
+        Hardware.THREEG: BasePowerCalculator.get_3g_power,
+        Hardware.GPS: BasePowerCalculator.get_gps_power,
+        Hardware.AUDIO: BasePowerCalculator.get_audio_power,
+        Hardware.SENSORS: BasePowerCalculator.get_sensor_power,
+    }
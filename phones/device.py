@@ -4,7 +4,9 @@ from utils.hardware import Hardware
 
 
 class Device(object):
-    hardware = {
+    # Monitor class for each hardware component of the device. Monitors are
+    # only instantiated the first time hardware is accessed
+    monitors = {
         Hardware.CPU: None,
         Hardware.LCD: None,
         Hardware.OLED: None,
@@ -26,6 +28,23 @@ class Device(object):
         Hardware.SENSORS: None,
     }
 
+    # Device constants handed to every monitor
+    constants = None
+
     # This is an abstract class that should be extended and incr
     def __init__(self):
-        raise NotImplementedError
+        if self.constants is None:
+            raise NotImplementedError
+        self._hardware = None
+
+    @property
+    def hardware(self):
+        """ Return { hardware name : monitor } for every hardware component
+        the device has. """
+        if self._hardware is None:
+            self._hardware = dict(
+                (name, monitor(self.constants))
+                for name, monitor in self.monitors.items()
+                if monitor is not None)
+
+        return self._hardware
@@ -103,34 +103,12 @@ class Constants(BaseConstants):
         if monitor_name == Hardware.THREEG:
             return cls.get_3g_dch_power("")
         if monitor_name == Hardware.SENSORS:
-            return sum(cls.SENSOR_PWR_RATIOS.values)
+            return sum(cls.get_sensor_pwr_ratios().values())
 
         # Where does this value come from?
         return 900
 
 
-class DreamPhone(BaseDevice):
-    hardware = {
-        Hardware.CPU: CPU(Constants),
-        Hardware.LCD: LCD(Constants),
-        Hardware.WIFI: Wifi(Constants),
-        Hardware.THREEG: ThreeG(Constants),
-        Hardware.GPS: GPS(Constants),
-        Hardware.AUDIO: Audio(Constants),
-        Hardware.SENSORS: Sensors(Constants),
-    }
-
-    power_function = {
-        Hardware.CPU: PowerCalculator.get_cpu_power,
-        Hardware.LCD: PowerCalculator.get_lcd_power,
-        Hardware.WIFI: PowerCalculator.get_wifi_power,
-        Hardware.THREEG: PowerCalculator.get_3g_power,
-        Hardware.GPS: PowerCalculator.get_gps_power,
-        Hardware.AUDIO: PowerCalculator.get_audio_power,
-        Hardware.SENSORS: PowerCalculator.get_sensor_power,
-    }
-
-
 class PowerCalculator(BasePowerCalculator):
     @classmethod
     def get_lcd_power(cls, lcd_data):
@@ -143,3 +121,27 @@ class PowerCalculator(BasePowerCalculator):
     @classmethod
     def get_oled_power(cls, oled_data):
         raise NotImplementedError
+
+
+class DreamPhone(BaseDevice):
+    constants = Constants
+
+    monitors = {
+        Hardware.CPU: CPU,
+        Hardware.LCD: LCD,
+        Hardware.WIFI: Wifi,
+        Hardware.THREEG: ThreeG,
+        Hardware.GPS: GPS,
+        Hardware.AUDIO: Audio,
+        Hardware.SENSORS: Sensors,
+    }
+
+    power_function = {
+        Hardware.CPU: PowerCalculator.get_cpu_power,
+        Hardware.LCD: PowerCalculator.get_lcd_power,
+        Hardware.WIFI: PowerCalculator.get_wifi_power,
+        Hardware.THREEG: PowerCalculator.get_3g_power,
+        Hardware.GPS: PowerCalculator.get_gps_power,
+        Hardware.AUDIO: PowerCalculator.get_audio_power,
+        Hardware.SENSORS: PowerCalculator.get_sensor_power,
+    }
@@ -66,11 +66,25 @@ class Constants(BaseConstants):
         raise NotImplementedError("Needs implementation")
 
 
+class PowerCalculator(BasePowerCalculator):
+    # Galaxy Nexus has no LCd screen
+    @classmethod
+    def get_lcd_power(cls, lcd_data):
+        raise NotImplementedError
+
+    @classmethod
+    def get_oled_power(cls, oled_data):
+        # TODO
+        return NotImplementedError("Needs implementation")
+
+
 class MaguroPhone(BaseDevice):
-    hardware = {
-        Hardware.CPU: CPU(Constants),
-        Hardware.OLED: OLED(Constants),
-        Hardware.WIFI: Wifi(Constants),
+    constants = Constants
+
+    monitors = {
+        Hardware.CPU: CPU,
+        Hardware.OLED: OLED,
+        Hardware.WIFI: Wifi,
         Hardware.THREEG: None,
         Hardware.GPS: None,
         Hardware.AUDIO: None,
@@ -86,15 +100,3 @@ class MaguroPhone(BaseDevice):
         Hardware.AUDIO: None,
         Hardware.SENSORS: None
     }
-
-
-class PowerCalculator(BasePowerCalculator):
-    # Galaxy Nexus has no LCd screen
-    @classmethod
-    def get_lcd_power(cls, lcd_data):
-        raise NotImplementedError
-
-    @classmethod
-    def get_oled_power(cls, oled_data):
-        # TODO
-        return NotImplementedError("Needs implementation")
@@ -106,28 +106,6 @@ class Constants(BaseConstants):
         return super(Constants, cls).get_max_power(monitor_name)
 
 
-class PassionPhone(BaseDevice):
-    hardware = {
-        Hardware.CPU: CPU(Constants),
-        Hardware.LCD: LCD(Constants),
-        Hardware.WIFI: Wifi(Constants),
-        Hardware.THREEG: ThreeG(Constants),
-        Hardware.GPS: GPS(Constants),
-        Hardware.AUDIO: Audio(Constants),
-        Hardware.SENSORS: Sensors(Constants),
-    }
-
-    power_function = {
-        Hardware.CPU: PowerCalculator.get_cpu_power,
-        Hardware.LCD: PowerCalculator.get_lcd_power,
-        Hardware.WIFI: PowerCalculator.get_wifi_power,
-        Hardware.THREEG: PowerCalculator.get_3g_power,
-        Hardware.GPS: PowerCalculator.get_gps_power,
-        Hardware.AUDIO: PowerCalculator.get_audio_power,
-        Hardware.SENSORS: PowerCalculator.get_sensor_power,
-    }
-
-
 class PowerCalculator(BasePowerCalculator):
     # HTC Passion has no LCD screen
     @classmethod
@@ -146,3 +124,27 @@ class PowerCalculator(BasePowerCalculator):
         else:
             return (Constants.OLED_BASE_PWR + oled_data.pixPower *
                     oled_data.brightness)
+
+
+class PassionPhone(BaseDevice):
+    constants = Constants
+
+    monitors = {
+        Hardware.CPU: CPU,
+        Hardware.LCD: LCD,
+        Hardware.WIFI: Wifi,
+        Hardware.THREEG: ThreeG,
+        Hardware.GPS: GPS,
+        Hardware.AUDIO: Audio,
+        Hardware.SENSORS: Sensors,
+    }
+
+    power_function = {
+        Hardware.CPU: PowerCalculator.get_cpu_power,
+        Hardware.LCD: PowerCalculator.get_lcd_power,
+        Hardware.WIFI: PowerCalculator.get_wifi_power,
+        Hardware.THREEG: PowerCalculator.get_3g_power,
+        Hardware.GPS: PowerCalculator.get_gps_power,
+        Hardware.AUDIO: PowerCalculator.get_audio_power,
+        Hardware.SENSORS: PowerCalculator.get_sensor_power,
+    }
@@ -21,5 +21,9 @@ class IterationData(object):
     def set_uid_usage(self, uid, usage):
         self.uid_usage[uid] = usage
 
+    def bulk_set_uid_usage(self, usages):
+        """ Set usage of every uid in { uid : usage } at once. """
+        self.uid_usage.update(usages)
+
     def set_sys_usage(self, usage):
         self.uid_usage[SystemInfo.AID_ALL] = usage
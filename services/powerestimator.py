@@ -175,8 +175,9 @@ class PowerEstimator(threading.Thread):
     def _log_power(self, power, hw_data):
         out = "total-power {%.2f}\n".format(power)
 
-        # Finish this
+        # TODO: Finish this
         for uid, usage in hw_data.iteritems():
+            pass
 
         with self._loglock:
             self._log.write("== POWER START ==\n")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+from monitors.screen.oled import OLED
+
+import unittest
+
+class FakeDisplay(object):
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+class FakeConstants(object):
+    OLED_CHANNEL_PWRS = (3.0647e-006 * 65025, 4.4799e-006 * 65025,
+                         6.4045e-006 * 65025)
+    OLED_MODULATION_PWR = 1.758e-006 * 585225
+
+class TestOLED(unittest.TestCase):
+
+    RED_PWR = 3.0647e-006
+    GREEN_PWR = 4.4799e-006
+    BLUE_PWR = 6.4045e-006
+    MODULATION_PWR = 1.758e-006
+
+    def setUp(self):
+        self.red_lut = [self.RED_PWR * c * c for c in range(256)]
+        self.green_lut = [self.GREEN_PWR * c * c for c in range(256)]
+        self.blue_lut = [self.BLUE_PWR * c * c for c in range(256)]
+        self.sum_lut = [-self.MODULATION_PWR * c * c for c in range(766)]
+
+    def tearDown(self):
+        if 'Display' in vars(OLED):
+            del OLED.Display
+
+    def _make_oled(self, width, height):
+        OLED.Display = FakeDisplay(width, height)
+        oled = OLED(FakeConstants)
+        oled._on_exit()
+        return oled
+
+    def test_tiny_screen(self):
+        """ Screens with fewer pixels than samples are not sampled """
+        for width, height in ((0, 0), (10, 10)):
+            oled = self._make_oled(width, height)
+            self.assertEqual(oled._fb_samples, ())
+            self.assertTrue(oled._fb_struct is None)
+            self.assertEqual(oled._read_fb_samples(), ())
+
+    def test_samples(self):
+        oled = self._make_oled(100, 50)
+        self.assertEqual(len(oled._fb_samples), OLED.NSAMPLES)
+        self.assertEqual(list(oled._fb_samples), sorted(oled._fb_samples))
+        self.assertTrue(oled._fb_samples[-1] < 100 * 50)
+
+    def _pixel_power(self, red, green, blue):
+        sum_colors = red + green + blue
+        return (self.RED_PWR * red * red + self.GREEN_PWR * green * green +
+                self.BLUE_PWR * blue * blue -
+                self.MODULATION_PWR * sum_colors * sum_colors)
+
+    def test_pixel_power_black(self):
+        self.assertEqual(OLED._pixel_power((0, 0, 0), self.red_lut,
+                                           self.green_lut, self.blue_lut,
+                                           self.sum_lut), 0.0)
+
+    def test_pixel_power(self):
+        """ Test lookup table kernel against the pixel power polynomial """
+        # (blue, green, red) for each pixel
+        channels = (0, 0, 255, 0, 255, 0, 255, 0, 0, 0x20, 0x40, 0x80)
+        expected = (self._pixel_power(255, 0, 0) +
+                    self._pixel_power(0, 255, 0) +
+                    self._pixel_power(0, 0, 255) +
+                    self._pixel_power(0x80, 0x40, 0x20))
+
+        self.assertAlmostEqual(OLED._pixel_power(channels, self.red_lut,
+                                                 self.green_lut, self.blue_lut,
+                                                 self.sum_lut), expected)
+
+if __name__ == "__main__":
+    unittest.main()
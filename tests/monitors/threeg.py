@@ -1,19 +1,29 @@
 #!/usr/bin/env python
 
+from libs.telephony import TelephonyAccess
 from monitors.threeg import ThreeG
 from monitors.threeg import ThreeGUsage
 from monitors.threeg import ThreeGState
-from phones.device import DeviceConstants
+from phones.base import Constants
 
-import mox
+import errno
+import os
+import shutil
+import tempfile
 import time
 import unittest
 
+try:
+    import mox
+except ImportError:
+    mox = None
+
+@unittest.skipIf(mox is None, "mox is not installed")
 class TestThreeG(unittest.TestCase):
 
     def setUp(self):
         self.m = mox.Mox()
-        self.constants = self.m.CreateMock(DeviceConstants)
+        self.constants = self.m.CreateMock(Constants)
         telephony = self.m.CreateMock(TelephonyAccess)
 
     def tearDown(self):
@@ -23,6 +33,7 @@ class TestThreeG(unittest.TestCase):
         pass
 
 
+@unittest.skipIf(mox is None, "mox is not installed")
 class TestThreeState(unittest.TestCase):
 
     def setUp(self):
@@ -170,5 +181,114 @@ class TestThreeState(unittest.TestCase):
     def test_is_stale_success(self):
         self.assetTrue(self.state.is_stale())
 
+
+class TestThreeGStateTimestamps(unittest.TestCase):
+    """ Tests with timestamps given by the caller, which need no clock
+    stubs """
+
+    def setUp(self):
+        self.state = ThreeGState(2, 1, 0, 0)
+
+    def test_is_stale_uninitialized(self):
+        """ Test a state that was never updated is polled """
+        self.assertFalse(self.state.is_stale(0))
+
+    def test_update_timestamp(self):
+        """ Test update() for IDLE -> FACH """
+        self.state.update(2, 2, 2800, 2800, 1000)
+        self.state.update(4, 4, 5600, 5600, 2000)
+        self.assertEqual(self.state.delta_pkts, 4)
+        self.assertEqual(self.state.pwr_state, ThreeG.POWER_STATE_FACH)
+
+
+
+class TestThreeGUidFiles(unittest.TestCase):
+    """ Tests of the UID counter files, read from a temporary directory """
+
+    class Constants(object):
+        THREEG_INTERFACE = "rmnet0"
+
+        @classmethod
+        def get_3g_dchfach_time(cls, provider):
+            return 2
+
+        @classmethod
+        def get_3g_fachidle_time(cls, provider):
+            return 1
+
+        @classmethod
+        def get_3g_tx_queue(cls, provider):
+            return 0
+
+        @classmethod
+        def get_3g_rx_queue(cls, provider):
+            return 0
+
+    def setUp(self):
+        self.os_open = os.open
+        self.dir = tempfile.mkdtemp()
+        for uid in (1, 2):
+            os.mkdir(os.path.join(self.dir, str(uid)))
+            for name, count in (("tcp_snd", 10 * uid), ("tcp_rcv", 20 * uid)):
+                with open(os.path.join(self.dir, str(uid), name), "w") as fp:
+                    fp.write("{0}\n".format(count))
+
+        self.threeg = ThreeG(self.Constants)
+        self.threeg.UID_TX_BYTE_MASK = os.path.join(self.dir, "{0}", "tcp_snd")
+        self.threeg.UID_RX_BYTE_MASK = os.path.join(self.dir, "{0}", "tcp_rcv")
+        self.threeg.MAX_UID_FDS = 1
+        self.states = {}
+        for uid in (1, 2):
+            self.states[uid] = self.threeg._uid_states[uid] = ThreeGState(
+                2, 1, 0, 0)
+
+    def tearDown(self):
+        os.open = self.os_open
+        self.threeg._clear_uid_states()
+        shutil.rmtree(self.dir)
+
+    def test_read_uid_bytes(self):
+        self.assertEqual(self.threeg._read_uid_bytes(1, self.states[1]),
+                         (10, 20))
+        self.assertIsNotNone(self.states[1].tx_fd)
+        # Files are kept open and read again
+        self.assertEqual(self.threeg._read_uid_bytes(1, self.states[1]),
+                         (10, 20))
+
+    def test_uid_fd_cap(self):
+        """ Test UIDs beyond MAX_UID_FDS are read without caching files """
+        self.threeg._read_uid_bytes(1, self.states[1])
+        self.assertEqual(self.threeg._read_uid_bytes(2, self.states[2]),
+                         (20, 40))
+        self.assertIsNone(self.states[2].tx_fd)
+        self.assertEqual(self.threeg._uid_fd_count, 1)
+
+        self.threeg._clear_uid_states([2])
+        self.assertEqual(self.threeg._uid_fd_count, 0)
+
+    def test_uid_out_of_fds(self):
+        """ Test running out of descriptors closes the cached files """
+        self.threeg.MAX_UID_FDS = 2
+        self.threeg._read_uid_bytes(1, self.states[1])
+        failures = [OSError(errno.EMFILE, "Too many open files")]
+
+        def open_(path, flags):
+            if failures:
+                raise failures.pop()
+            return self.os_open(path, flags)
+        os.open = open_
+
+        self.assertEqual(self.threeg._read_uid_bytes(2, self.states[2]),
+                         (20, 40))
+        self.assertEqual(failures, [])
+        self.assertIsNone(self.states[1].tx_fd)
+        self.assertIsNone(self.states[2].tx_fd)
+        self.assertEqual(self.threeg._uid_fd_count, 0)
+
+    def test_uid_gone(self):
+        self.assertEqual(self.threeg._read_uid_bytes(3, ThreeGState(
+            2, 1, 0, 0)), (-1, -1))
+        self.assertEqual(self.threeg._uid_fd_count, 0)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+from phones.base import BasePowerCalculator, Constants
+
+import unittest
+
+class TestBasePowerCalculator(unittest.TestCase):
+
+    SPEEDS = [1, 2, 5.5, 6]
+    RATIOS = [47.122645, 46.354821, 43.667437, 43.283525]
+
+    def test_interpolate(self):
+        self.assertAlmostEqual(BasePowerCalculator._interpolate(
+            1.5, self.SPEEDS, self.RATIOS), (47.122645 + 46.354821) / 2)
+
+    def test_interpolate_exact(self):
+        self.assertAlmostEqual(BasePowerCalculator._interpolate(
+            5.5, self.SPEEDS, self.RATIOS), 43.667437)
+
+    def test_interpolate_out_of_range(self):
+        """ Test speeds outside the table get the closest ratio """
+        self.assertEqual(BasePowerCalculator._interpolate(
+            0, self.SPEEDS, self.RATIOS), self.RATIOS[0])
+        self.assertEqual(BasePowerCalculator._interpolate(
+            54, self.SPEEDS, self.RATIOS), self.RATIOS[-1])
+
+
+
+class TestCPUPowerRatios(unittest.TestCase):
+
+    class CPUData(object):
+        def __init__(self, freq):
+            self.freq = freq
+            self.usr_perc = 10
+            self.sys_perc = 0
+
+    def setUp(self):
+        self.freqs = Constants.CPU_FREQS
+        self.ratios = Constants.CPU_PWR_RATIOS
+
+    def tearDown(self):
+        self._set_table(self.freqs, self.ratios)
+
+    def _set_table(self, freqs, ratios):
+        Constants.CPU_FREQS = freqs
+        Constants.CPU_PWR_RATIOS = ratios
+        if '_cpu_pwr_ratio_lut' in vars(Constants):
+            del Constants._cpu_pwr_ratio_lut
+
+    def test_lut(self):
+        self._set_table([100, 104], [1.0, 2.0])
+        self.assertEqual(Constants.get_cpu_pwr_ratio_lut(),
+                         [1.0, 1.25, 1.5, 1.75, 2.0])
+
+    def test_lut_single_ratio(self):
+        self._set_table([100, 200], [3.0])
+        self.assertEqual(Constants.get_cpu_pwr_ratio_lut(), [3.0])
+
+    def test_lut_fewer_ratios_than_freqs(self):
+        self._set_table([100, 102, 110], [1.0, 2.0])
+        self.assertEqual(Constants.get_cpu_pwr_ratio_lut(), [1.0, 1.5, 2.0])
+
+    def test_lut_no_ratios(self):
+        self._set_table([100, 200], [])
+        self.assertEqual(Constants.get_cpu_pwr_ratio_lut(), [])
+        self.assertEqual(BasePowerCalculator.get_cpu_power(
+            self.CPUData(150)), 0)
+
+    def test_cpu_power_rounds_freq(self):
+        self._set_table([100, 104], [1.0, 2.0])
+        self.assertAlmostEqual(BasePowerCalculator.get_cpu_power(
+            self.CPUData(101.6)), 15.0)
+        self.assertAlmostEqual(BasePowerCalculator.get_cpu_power(
+            self.CPUData(500)), 20.0)
+
+if __name__ == "__main__":
+    unittest.main()
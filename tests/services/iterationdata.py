@@ -32,5 +32,22 @@ class TestIterationData(object):
         self.data.set_usage(10)
         self.assertEqual(self.uid_usage[SystemInfo.AID_ALL], 10)
 
+class TestIterationDataUidUsage(unittest.TestCase):
+
+    def setUp(self):
+        self.data = IterationData()
+        self.data.uid_usage[2] = UsageData(10)
+
+    def test_bulk_set_uid_usage(self):
+        self.data.bulk_set_uid_usage({3: UsageData(15), 4: UsageData(20)})
+        self.assertEqual(sorted(self.data.uid_usage.keys()), [2, 3, 4])
+        self.assertEqual(self.data.uid_usage[2].usage, 10)
+        self.assertEqual(self.data.uid_usage[4].usage, 20)
+
+    def test_bulk_set_uid_usage_replaces(self):
+        usage = UsageData(30)
+        self.data.bulk_set_uid_usage({2: usage})
+        self.assertTrue(self.data.uid_usage[2] is usage)
+
 if __name__ == "__main__":
     unittest.main()
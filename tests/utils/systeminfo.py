@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+from utils import systeminfo
+from utils.systeminfo import SystemInfo
+
+import errno
+import os
+import unittest
+
+class TestSystemInfo(unittest.TestCase):
+
+    PROC_STAT = (b"cpu  30 3 20 400 10 1 2 0 0 0\n"
+                 b"cpu0 10 1 5 100 2 0 1 0 0 0\n"
+                 b"cpu2 20 2 15 300 8 1 1 0 0 0\n"
+                 b"intr 105099 0 0 0\n"
+                 b"ctxt 112233\n")
+
+    PID_STAT = (b"1234 (com.example) S 100 1234 0 0 -1 4194624 5188 0 1 0 "
+                b"152 37 0 0 20 0 12 0 2141 536948736 8714 4294967295 1 1 0 "
+                b"0 0 0 4612 0 38136 4294967295 0 0 17 0 0 0 0 0 0\n")
+
+    def setUp(self):
+        SystemInfo._pid_uid_cache.clear()
+        SystemInfo._pid_uid_neg_cache.clear()
+        self.os_open = os.open
+        self.max_stat_fds = SystemInfo.MAX_STAT_FDS
+        self.read_proc_file = vars(SystemInfo)['_read_proc_file']
+        self.read_uid_for_pid = vars(SystemInfo)['_read_uid_for_pid']
+        self.clock = systeminfo.SystemClock
+
+    def tearDown(self):
+        os.open = self.os_open
+        SystemInfo.MAX_STAT_FDS = self.max_stat_fds
+        SystemInfo._read_proc_file = self.read_proc_file
+        SystemInfo._read_uid_for_pid = self.read_uid_for_pid
+        systeminfo.SystemClock = self.clock
+        SystemInfo._pid_uid_cache.clear()
+        SystemInfo._pid_uid_neg_cache.clear()
+        SystemInfo.cleanup_dead_pids([])
+        SystemInfo._cpu_times_iter = None
+
+    def test_cleanup_dead_pids(self):
+        SystemInfo._pid_uid_cache.update({1: 1000, 2: 10001})
+        SystemInfo.cleanup_dead_pids([1])
+
+        self.assertEqual(SystemInfo._pid_uid_cache, {1: 1000})
+        self.assertEqual(SystemInfo.get_uid_for_pid(1), 1000)
+
+    def test_stat_cache(self):
+        pid = os.getpid()
+        self.assertEqual(len(SystemInfo.get_pid_usr_sys_times(pid)), 2)
+        self.assertTrue(pid in SystemInfo._stat_fds)
+
+        SystemInfo.cleanup_dead_pids([])
+        self.assertEqual(SystemInfo._stat_fds, {})
+
+    def test_stat_cache_full(self):
+        SystemInfo.MAX_STAT_FDS = 0
+
+        self.assertEqual(len(SystemInfo.get_pid_usr_sys_times(os.getpid())),
+                         2)
+        self.assertEqual(SystemInfo._stat_fds, {})
+
+    def test_stat_out_of_fds(self):
+        SystemInfo.get_pid_usr_sys_times(os.getpid())
+        failures = [OSError(errno.EMFILE, "Too many open files")]
+
+        def open_(path, flags):
+            if failures:
+                raise failures.pop()
+            return self.os_open(path, flags)
+        os.open = open_
+
+        # Cached descriptors are given back and the file is still read
+        self.assertEqual(len(SystemInfo.get_pid_usr_sys_times(os.getppid())),
+                         2)
+        self.assertEqual(failures, [])
+        self.assertEqual(SystemInfo._stat_fds, {})
+
+    def _stub_uid_lookup(self, uid):
+        now = [1000]
+        lookups = []
+
+        class Clock(object):
+            @staticmethod
+            def elapsedRealtime():
+                return now[0]
+        systeminfo.SystemClock = Clock
+
+        def read_uid_for_pid(cls, pid):
+            lookups.append(pid)
+            return uid
+        SystemInfo._read_uid_for_pid = classmethod(read_uid_for_pid)
+        return now, lookups
+
+    def test_uid_for_pid_failed_recently(self):
+        now, lookups = self._stub_uid_lookup(-1)
+        self.assertEqual(SystemInfo.get_uid_for_pid(3), -1)
+        self.assertEqual(SystemInfo.get_uid_for_pid(3), -1)
+        self.assertEqual(lookups, [3])
+
+        # The lookup is retried once the timeout has passed
+        now[0] += SystemInfo.UID_RETRY_TIMEOUT
+        self.assertEqual(SystemInfo.get_uid_for_pid(3), -1)
+        self.assertEqual(lookups, [3, 3])
+
+        SystemInfo.cleanup_dead_pids([])
+        self.assertEqual(SystemInfo._pid_uid_neg_cache, {})
+
+    def test_uid_name_known(self):
+        for uid, name in SystemInfo.UID_NAMES.items():
+            self.assertEqual(SystemInfo.get_uid_name(uid), name)
+
+    def test_uid_name_system(self):
+        self.assertEqual(SystemInfo.get_uid_name(SystemInfo.AID_INET),
+                         "sys_3003")
+        self.assertEqual(SystemInfo.get_uid_name(SystemInfo.AID_ALL), "sys_-1")
+
+    def _stub_proc_stat(self):
+        data = self.PROC_STAT
+        SystemInfo._read_proc_file = classmethod(lambda cls, path, size: data)
+
+    def test_read_all_cpu_times(self):
+        """ Core 1 is offline and missing from /proc/stat """
+        self._stub_proc_stat()
+        self.assertEqual(SystemInfo._read_all_cpu_times(),
+                         [[11, 6, 119], None, [22, 17, 347]])
+
+    def test_usr_sys_total_times(self):
+        self._stub_proc_stat()
+        self.assertEqual(SystemInfo.get_usr_sys_total_times(0), [11, 6, 119])
+        self.assertEqual(SystemInfo.get_usr_sys_total_times(2), [22, 17, 347])
+
+    def test_all_cpu_times_shared_per_iteration(self):
+        reads = []
+        data = self.PROC_STAT
+
+        def read_proc_file(cls, path, size):
+            reads.append(path)
+            return data
+        SystemInfo._read_proc_file = classmethod(read_proc_file)
+
+        self.assertEqual(SystemInfo.get_usr_sys_total_times(0, 5), [11, 6, 119])
+        self.assertEqual(SystemInfo.get_usr_sys_total_times(2, 5),
+                         [22, 17, 347])
+        self.assertEqual(SystemInfo.get_usr_sys_total_times(1, 5), [])
+        self.assertEqual(len(reads), 1)
+
+        SystemInfo.get_usr_sys_total_times(0, 6)
+        self.assertEqual(len(reads), 2)
+
+    def test_usr_sys_total_times_offline(self):
+        self._stub_proc_stat()
+        self.assertEqual(SystemInfo.get_usr_sys_total_times(1), [])
+        self.assertEqual(SystemInfo.get_usr_sys_total_times(3), [])
+
+    def test_parse_cpu_times(self):
+        line = b"cpu1 16735 10 4158 69189 109 3 2 45 0 0"
+        # usr = user + nice, sys = system + irq + softirq
+        self.assertEqual(SystemInfo._parse_cpu_times(line),
+                         [16745, 4163, 16745 + 4163 + 69189 + 109])
+
+    def test_parse_cpu_times_not_cpu(self):
+        self.assertRaises(ValueError, SystemInfo._parse_cpu_times,
+                          b"intr 105099 0 0 0")
+
+    def test_parse_status_uid(self):
+        data = (b"Name:\tcom.example\nState:\tS (sleeping)\nTgid:\t1234\n"
+                b"Pid:\t1234\nPPid:\t100\nTracerPid:\t0\n"
+                b"Uid:\t10045\t10045\t10045\t10045\n"
+                b"Gid:\t10045\t10045\t10045\t10045\n")
+        self.assertEqual(SystemInfo._parse_status_uid(data), 10045)
+
+    def test_parse_pid_stat(self):
+        self.assertEqual(SystemInfo._parse_pid_stat(self.PID_STAT), [152, 37])
+
+    def test_parse_pid_stat_comm_with_spaces(self):
+        data = self.PID_STAT.replace(b"(com.example)", b"(Binder (1) Thr)")
+        self.assertEqual(SystemInfo._parse_pid_stat(data), [152, 37])
+
+    def test_parse_pid_stat_truncated(self):
+        self.assertRaises(IndexError, SystemInfo._parse_pid_stat,
+                          b"1234 (sh) S 100 1234")
+
+if __name__ == "__main__":
+    unittest.main()
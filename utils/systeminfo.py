@@ -1,9 +1,13 @@
 #!/usr/bin/env python
 
 from jnius import autoclass
+from libs.clock import SystemClock
 
+from array import array
+import errno
 import logging
 import os
+import threading
 
 Process = autoclass('android.os.Process')
 PythonActivity = autoclass('org.renpy.android.PythonActivity').mActivity
@@ -53,23 +57,68 @@ class SystemInfo(object):
                  AID_MEDIA: "Media server", AID_DHCP: "DHCP client",
                  AID_SHELL: "Shell client", AID_CACHE: "Cache access",
                  AID_DIAG: "Diagnostics"}
+    # Names of the dense range of uids up to AID_DHCP indexed by uid, None
+    # for uids without a name. Names above AID_DHCP come from UID_NAMES
+    _UID_NAMES_LOW = tuple(map(UID_NAMES.get, range(AID_DHCP + 1)))
 
-    PID_STAT_MASK = "/proc/{0}/stat"
+    PID_STAT_MASK = b"/proc/%d/stat"
     PROC_DIR = "/proc"
     PROC_MEM_FILE = "/proc/meminfo"
     PROC_STAT_FILE = "/proc/stat"
     UID_STATS_DIR = "/proc/uid_stat/"
-    UID_STATUS_MASK = "/proc/{0}/status"
+    UID_STATUS_MASK = b"/proc/%d/status"
 
     INDEX_USR_TIME = 0
     INDEX_SYS_TIME = 1
     INDEX_TOTAL_TIME = 2
 
+    INDEX_MEM_TOTAL = 0
+    INDEX_MEM_FREE = 1
+    INDEX_MEM_BUFFERS = 2
+    INDEX_MEM_CACHED = 3
+
+    UID_RETRY_TIMEOUT = 30000   # ms before retrying a failed uid lookup
+    # Apps are limited to 1024 descriptors on the targeted Android versions.
+    # Stat files of pids beyond this many are opened and closed on each read
+    MAX_STAT_FDS = 256
+
     logger = logging.getLogger("SystemInfo")
 
+    _pid_uid_cache = {}
+    _pid_uid_neg_cache = {}     # pid -> uptime (ms) of the next uid lookup
+    _stat_fds = {}      # pid -> open /proc/<pid>/stat descriptor
+    _HAS_PREAD = hasattr(os, "pread")   # Python 3.3+
+    _stat_lock = threading.Lock()
+    _sys_uid_names = {}     # uid -> "sys_<uid>" for uids below AID_APP
+    _uid_pkg_cache = {}     # uid -> package name
+    _package_manager = None
+    _cpu_times = []     # per-core times of the last /proc/stat snapshot
+    _cpu_times_iter = None  # iteration of that snapshot
+    _cpu_times_lock = threading.Lock()
+
     @classmethod
     def get_uid_for_pid(cls, pid):
+        # The uid of a process never changes. Entries are dropped by
+        # cleanup_dead_pids() once the pid is gone, before it can be reused
+        uid = cls._pid_uid_cache.get(pid)
+        if uid is not None:
+            return uid
 
+        # Do not retry pids which just failed, they are most likely exiting.
+        # Uptime is used so that changes of the wall clock do not matter
+        now = SystemClock.elapsedRealtime()
+        if cls._pid_uid_neg_cache.get(pid, 0) > now:
+            return -1
+
+        uid = cls._read_uid_for_pid(pid)
+        if uid >= 0:
+            cls._pid_uid_cache[pid] = uid
+        else:
+            cls._pid_uid_neg_cache[pid] = now + cls.UID_RETRY_TIMEOUT
+        return uid
+
+    @classmethod
+    def _read_uid_for_pid(cls, pid):
         try:
             uid = Process.getUidForPid(pid)
             return uid
@@ -79,89 +128,306 @@ class SystemInfo(object):
         # Above method may not be available. Try from kernel
 
         try:
-            with open(cls.UID_STATUS_MASK.format(pid)) as fp:
-                data = fp.readlines(6)
-                if data[6].startswith("Uid"):
-                    uid_str = data[6].split(":")[1].split()[0]
-                    return int(uid_str)
-        except IOError:
+            return cls._parse_status_uid(
+                cls._read_proc_file(cls._status_path(pid), 2048))
+        except (OSError, ValueError):
             pass
 
         cls.logger.error("Failed to read UID for PID {0}".format(pid))
 
         return -1
 
+    @staticmethod
+    def _parse_status_uid(data):
+        """ Return the real uid from the contents of /proc/<pid>/status """
+        # Line looks like "Uid:\t<real>\t<effective>\t<saved>\t<fs>"
+        start = data.index(b'\nUid:\t') + 6
+        return int(data[start:data.index(b'\t', start)])
+
     @classmethod
     def get_running_pids(cls):
-        # Assume all files in PROC_DIR which are numbers represent pids
+        """ Return the pids in /proc as a packed array of ints """
+        return cls._scan_proc_pids()
+
+    @classmethod
+    def _scan_proc_pids(cls):
+        # Assume all directories in PROC_DIR which are numbers represent pids
         # WARNING: isdigit() only works with non-negative integers
-        pids = [int(file_)
-                for file_ in os.listdir(cls.PROC_DIR) if file_.isdigit()]
-        return pids
+        scandir = getattr(os, "scandir", None)
+        if scandir is None:
+            return array('i', (int(file_) for file_ in os.listdir(cls.PROC_DIR)
+                               if file_.isdigit()))
+
+        # scandir() gets the entry type from getdents itself, so regular
+        # files in /proc are skipped without a stat() per entry
+        return array('i', (int(entry.name) for entry in scandir(cls.PROC_DIR)
+                           if entry.name.isdigit() and
+                           entry.is_dir(follow_symlinks=False)))
 
     @classmethod
     def get_uid_name(cls, uid):
         """Return package name associated with uid. Caveat: some apps share
         the same uids"""
 
-        if cls.UID_NAMES.has_key(uid):
-            return cls.UID_NAMES[uid]
-
         if uid < cls.AID_APP:
-            return "sys_{}".format(uid)
-
-        pm = PythonActivity.getPackageManager()
-        packages = pm.getPackagesForUid(uid)
-
-        if packages is not None:
-            return packages.toArray()[0]
+            if 0 <= uid < len(cls._UID_NAMES_LOW):
+                name = cls._UID_NAMES_LOW[uid]
+            else:
+                name = cls.UID_NAMES.get(uid)
+            if name is not None:
+                return name
+
+            # Only a handful of system uids exist, remember their names
+            name = cls._sys_uid_names.get(uid)
+            if name is None:
+                name = cls._sys_uid_names[uid] = "sys_{}".format(uid)
+            return name
+
+        name = cls._uid_pkg_cache.get(uid)
+        if name is not None:
+            return name
+
+        if cls._package_manager is None:
+            cls._package_manager = PythonActivity.getPackageManager()
+        # jnius already converts the returned String[] to a list
+        packages = cls._package_manager.getPackagesForUid(uid)
+
+        if packages:
+            name = cls._uid_pkg_cache[uid] = packages[0]
+            return name
 
         return "app_{}".format(uid)
 
     @classmethod
     def get_uids(cls):
-        return [int(uid) for uid in os.listdir(cls.UID_STATS_DIR)]
+        """ Return the uids with network statistics as a packed array of
+        ints """
+        return array('i', (int(uid) for uid in os.listdir(cls.UID_STATS_DIR)))
 
     @classmethod
     def get_pid_usr_sys_times(cls, pid):
         """ times should contain two elements: times[INDEX_USR_TIME] constains
-        user time for pid and times[INDEX_SYS_TIME] contains sys time for pid
+        user time for pid and times[INDEX_SYS_TIME] contains sys time for pid.
+        Callers reading many pids at once should use
+        get_pid_usr_sys_times_batch
         """
-        try:
-            with open(cls.PID_STAT_MASK.format(pid)) as fp:
-                data = fp.read().split()
-                return [int(data[13]), int(data[14])]
-        except (IOError, IndexError, ValueError):
-            pass
+        times = cls._read_pid_usr_sys_times(pid)
+        if times is not None:
+            return times
 
         cls.logger.error("Failed to read CPU time for PID {0}".format(pid))
 
         return []
 
     @classmethod
-    def get_usr_sys_total_times(cls, cpu):
+    def get_pid_usr_sys_times_batch(cls, pids):
+        """ Return a dict mapping every readable pid in pids to its
+        [usr, sys] times. Pids which could not be read (usually because the
+        process exited after the pid list was taken) are left out and
+        reported with a single log message for the whole batch
+        """
+        result = {}
+        failed = 0
+        for pid in pids:
+            times = cls._read_pid_usr_sys_times(pid)
+            if times is not None:
+                result[pid] = times
+            else:
+                failed += 1
+
+        if failed:
+            cls.logger.error("Failed to read CPU time for {0} of {1} "
+                             "PIDs".format(failed, failed + len(result)))
+
+        return result
+
+    @classmethod
+    def cleanup_dead_pids(cls, live_pids):
+        """ Forget the uids and close the stat files of pids which are not in
+        live_pids anymore. Should be called once per sampling cycle with the
+        result of get_running_pids()
+        """
+        for pid in set(cls._pid_uid_cache).difference(live_pids):
+            cls._pid_uid_cache.pop(pid, None)
+        for pid in set(cls._pid_uid_neg_cache).difference(live_pids):
+            cls._pid_uid_neg_cache.pop(pid, None)
+
+        with cls._stat_lock:
+            for pid in set(cls._stat_fds).difference(live_pids):
+                cls._close_stat_fd(pid)
+
+    @classmethod
+    def _read_pid_usr_sys_times(cls, pid):
+        # Stat files stay open between cycles. The lock keeps CPU monitors
+        # running in other threads from closing a descriptor or moving its
+        # offset in the middle of a read
+        with cls._stat_lock:
+            fd = cls._stat_fds.get(pid)
+            try:
+                if fd is None:
+                    data = cls._read_new_stat(pid)
+                else:
+                    data = cls._read_stat_fd(fd)
+            except (IOError, OSError):
+                # Process is gone, its pid may be reused by a new one
+                if fd is not None:
+                    cls._close_stat_fd(pid)
+                return None
+
+        try:
+            return cls._parse_pid_stat(data)
+        except (IndexError, ValueError):
+            return None
+
+    @classmethod
+    def _read_new_stat(cls, pid):
+        """ Open and read the stat file of a pid which has no cached
+        descriptor, and keep it open if the cache has room. Must be called
+        with _stat_lock held """
+        path = cls._stat_path(pid)
+        keep = len(cls._stat_fds) < cls.MAX_STAT_FDS
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError as e:
+            if e.errno not in (errno.EMFILE, errno.ENFILE):
+                raise
+            # Out of descriptors. Give the cached ones back to the rest of
+            # the app and read this file without keeping it open
+            cls.logger.warn("Out of file descriptors, closing {0} cached "
+                            "stat files".format(len(cls._stat_fds)))
+            for cached_pid in list(cls._stat_fds):
+                cls._close_stat_fd(cached_pid)
+            keep = False
+            fd = os.open(path, os.O_RDONLY)
+
+        try:
+            data = cls._read_stat_fd(fd)
+        except (IOError, OSError):
+            os.close(fd)
+            raise
+
+        if keep:
+            cls._stat_fds[pid] = fd
+        else:
+            os.close(fd)
+        return data
+
+    @classmethod
+    def _read_stat_fd(cls, fd):
+        # Reading from offset 0 makes procfs regenerate the contents
+        if cls._HAS_PREAD:
+            return os.pread(fd, 1024, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        return os.read(fd, 1024)
+
+    @classmethod
+    def _close_stat_fd(cls, pid):
+        try:
+            os.close(cls._stat_fds.pop(pid))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _parse_pid_stat(data):
+        """ Return [usr, sys] times from the contents of /proc/<pid>/stat.
+        The command name is enclosed in parenthesis and may contain spaces,
+        so fields are counted from the last ')' instead of from the start
+        """
+        # Field 3 (state) comes right after ") ", fields 14 and 15 (utime
+        # and stime) are 11 and 12 positions later. Everything after stime
+        # is left unsplit
+        fields = data[data.rindex(b')') + 2:].split(b' ', 13)
+        return [int(fields[11]), int(fields[12])]
+
+    @classmethod
+    def get_usr_sys_total_times(cls, cpu, iteration=None):
         """ times should contain seven elements. times[INDEX_USR_TIME]
         containts total user time, times[INDEX_SYS_TIME] contains total sys
         time, and times[INDEX_TOTAL_TIME] contains total time (including idle
-        cycles)
+        cycles). If iteration is given, the times come from the /proc/stat
+        snapshot shared by all cores during that iteration
         """
-        try:
-            with open(cls.PROC_STAT_FILE) as fp:
-                data = fp.readlines(cpu + 1)
-                if data[cpu + 1].startswith("cpu"):
-                    times = data[cpu + 1].strip().split()
-                    # [usr, sys, total]
-                    usr = int(times[1]) + int(times[2])
-                    sys = int(times[2]) + int(times[6]) + int(times[7])
-                    total = usr + sys + int(times[4]) + int(times[5])
-                    return [usr, sys, total]
-        except (IOError, IndexError, ValueError):
-            pass
+        if iteration is not None:
+            cpu_times = cls.get_all_cpu_times(iteration)
+            if cpu < len(cpu_times) and cpu_times[cpu] is not None:
+                return cpu_times[cpu]
+        else:
+            try:
+                data = cls._read_proc_file(cls.PROC_STAT_FILE, 16384)
+                # Only parse the line of this core. Offline cores are not
+                # listed by the kernel and fail the lookup
+                start = data.index(b'\ncpu%d ' % cpu) + 1
+                return cls._parse_cpu_times(cls._line_at(data, start))
+            except (OSError, IndexError, ValueError):
+                pass
 
         cls.logger.error("Failed to read CPU time")
 
         return []
 
+    @classmethod
+    def get_all_cpu_times(cls, iteration=None):
+        """ Return the [usr, sys, total] times of every cpu core, indexed by
+        core number, from a single read of /proc/stat. Offline cores are not
+        listed by the kernel and have None as their entry. Calls for the same
+        iteration share one read, so each core monitor does not read the file
+        again
+        """
+        with cls._cpu_times_lock:
+            if iteration is None or iteration != cls._cpu_times_iter:
+                try:
+                    cpu_times = cls._read_all_cpu_times()
+                except (OSError, IndexError, ValueError):
+                    cls.logger.error("Failed to read CPU time")
+                    cpu_times = []
+
+                cls._cpu_times = cpu_times
+                cls._cpu_times_iter = iteration
+
+            return cls._cpu_times
+
+    @classmethod
+    def _read_all_cpu_times(cls):
+        data = cls._read_proc_file(cls.PROC_STAT_FILE, 16384)
+
+        # The first line holds the sum of all cores and does not start with a
+        # newline, so this finds the per-core lines only
+        cpu_times = []
+        start = data.find(b'\ncpu')
+        while start != -1:
+            line = cls._line_at(data, start + 1)
+
+            cpu = int(line[3:line.index(b' ')])
+            if cpu >= len(cpu_times):
+                cpu_times.extend([None] * (cpu + 1 - len(cpu_times)))
+            cpu_times[cpu] = cls._parse_cpu_times(line)
+
+            start = data.find(b'\ncpu', start + len(line))
+
+        return cpu_times
+
+    @staticmethod
+    def _line_at(data, start):
+        """ Return the line of data starting at offset start, without the
+        trailing newline """
+        end = data.find(b'\n', start)
+        if end == -1:
+            return data[start:]
+        return data[start:end]
+
+    @staticmethod
+    def _parse_cpu_times(line):
+        """ Return [usr, sys, total] times from a cpu line of /proc/stat """
+        if not line.startswith(b'cpu'):
+            raise ValueError("Not a cpu line")
+
+        # Only the fields up to softirq are needed, leave the rest unsplit
+        times = line.split(None, 8)
+        usr = int(times[1]) + int(times[2])
+        sys = int(times[3]) + int(times[6]) + int(times[7])
+        total = usr + sys + int(times[4]) + int(times[5])
+        return [usr, sys, total]
+
     @classmethod
     def get_mem_info(cls):
         """ mem should contain 4 elements. mem[INDEX_MEM_TOTAL] contains total
@@ -170,21 +436,43 @@ class SystemInfo(object):
         (Kb), and mem[INDEX_MEM_CACHED] contains size of kernel caches (Kb)
         """
         try:
-            with open(cls.PROC_MEM_FILE) as fp:
-                data = fp.readlines(4)
-                if data[0].startswith("MemTotal"):
-                    total = int(data[0].split()[1])
-                if data[1].startswith("MemFree"):
-                    free = int(data[1].split()[1])
-                if data[2].startswith("Buffers"):
-                    buffers = int(data[2].split()[1])
-                if data[3].startswith("Cached"):
-                    cached = int(data[3].split()[1])
-
-                return [total, free, buffers, cached]
-        except (IOError, IndexError, ValueError):
+            data = cls._read_proc_file(cls.PROC_MEM_FILE).split(b'\n', 8)
+            # Newer kernels add lines like MemAvailable in between, so find
+            # the values by name instead of by line number
+            mem = {}
+            for line in data[:8]:
+                key, _, value = line.partition(b':')
+                mem[key] = value
+
+            return [int(mem[b'MemTotal'].split(None, 1)[0]),
+                    int(mem[b'MemFree'].split(None, 1)[0]),
+                    int(mem[b'Buffers'].split(None, 1)[0]),
+                    int(mem[b'Cached'].split(None, 1)[0])]
+        except (OSError, IndexError, KeyError, ValueError):
             pass
 
         cls.logger.error("Failed to read memory info")
 
         return []
+
+    @classmethod
+    def _stat_path(cls, pid):
+        # Paths are built as bytes with %, which is cheaper than str.format
+        # and is passed to the kernel without being encoded first
+        return cls.PID_STAT_MASK % pid
+
+    @classmethod
+    def _status_path(cls, pid):
+        return cls.UID_STATUS_MASK % pid
+
+    @classmethod
+    def _read_proc_file(cls, path, size=8192):
+        """ Read a procfs file with a single read() call. The kernel only
+        guarantees a consistent snapshot of the values within one read, so
+        the file must not be read in pieces
+        """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return os.read(fd, size)
+        finally:
+            os.close(fd)